@@ -54,7 +54,7 @@ const SaleForm = () => {
   };
 
   const searchProducts = async () => {
-    if (searchQuery.length < 2) {
+    if (searchQuery.length < 3) {
       setProducts([]);
       setSearching(false);
       return;
@@ -83,7 +83,7 @@ const SaleForm = () => {
   };
 
   useEffect(() => {
-    if (searchQuery.length >= 2) {
+    if (searchQuery.length >= 3) {
       const timeoutId = setTimeout(() => {
         searchProducts();
       }, 300);
@@ -230,7 +230,7 @@ const SaleForm = () => {
               
               {/* Lista de productos */}
               <div className="mt-3">
-                {searchQuery.length >= 2 ? (
+                {searchQuery.length >= 3 ? (
                   // Mostrar resultados de búsqueda
                   searching ? (
                     <div className="text-center py-3">
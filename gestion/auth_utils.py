@@ -1,5 +1,8 @@
 # gestion/auth_utils.py
 
+# Roles permitidos para operaciones de bodega (búsqueda O(1) en un set)
+_BODEGA_OR_ADMIN_ROLES = frozenset({'admin', 'bodega'})
+
 def check_role(user, roles):
     """
     Comprueba si un usuario pertenece a una lista de roles.
@@ -24,7 +27,7 @@ def is_bodega_or_admin(user):
     """ Chequea si es Admin O Bodeguero """
     if user.is_superuser:
         return True
-    return check_role(user, ['admin', 'bodega'])
+    return check_role(user, _BODEGA_OR_ADMIN_ROLES)
 
 def is_ventas_or_admin(user):
     """ Chequea si es Admin O Vendedor """
@@ -0,0 +1,25 @@
+# gestion/cache_utils.py
+import time
+
+from django.core.cache import cache
+
+# Zona de ventas (ver views.api_views.get_sales_zone_id)
+SALES_ZONE_CACHE_KEY = 'sales_zone_id'
+SALES_ZONE_CACHE_TIMEOUT = 300  # 5 minutos, la zona de ventas casi nunca cambia
+
+# Listados de zonas: se guardan bajo una "versión" que se renueva al modificar
+# zonas o bodegas, así no hay que conocer (ni borrar) cada clave por separado.
+ZONES_CACHE_TIMEOUT = 60
+_ZONES_VERSION_KEY = 'zones_cache_version'
+
+
+def get_zones_cache_version():
+    """Versión vigente de los datos de zonas en caché."""
+    # La versión también expira para acotar datos viejos en otros procesos
+    return cache.get_or_set(_ZONES_VERSION_KEY, time.time_ns, ZONES_CACHE_TIMEOUT)
+
+
+def invalidate_zones_cache():
+    """Invalida todo lo guardado en caché que depende de zonas o bodegas."""
+    cache.set(_ZONES_VERSION_KEY, time.time_ns(), ZONES_CACHE_TIMEOUT)
+    cache.delete(SALES_ZONE_CACHE_KEY)
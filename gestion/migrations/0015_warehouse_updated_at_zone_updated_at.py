@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-14 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0014_add_indexes_for_performance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warehouse',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-14 05:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0015_warehouse_updated_at_zone_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='gestion_pro_is_acti_9b2cc2_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'name', 'id'], name='gestion_pro_is_acti_ee658d_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated migration: índice trigram (pg_trgm) para la búsqueda de productos por nombre
+
+from django.db import migrations
+
+
+def create_name_trgm_index(apps, schema_editor):
+    # Los índices GIN con pg_trgm solo existen en PostgreSQL (en SQLite no se hace nada)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    # name__icontains en PostgreSQL genera UPPER("name"::text) LIKE UPPER('%q%'):
+    # el índice debe ser sobre esa misma expresión para que el planner lo use
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS gestion_product_name_upper_trgm "
+        "ON gestion_product USING gin ((UPPER(name::text)) gin_trgm_ops);"
+    )
+
+
+def drop_name_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS gestion_product_name_upper_trgm;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0016_product_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_trgm_index, drop_name_trgm_index),
+    ]
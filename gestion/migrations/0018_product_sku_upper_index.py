@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-14 05:36
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0017_product_search_trgm_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Upper('sku'), name='gestion_product_sku_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-14 05:51
+
+from django.db import migrations, models
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """
+    Une los items repetidos (misma orden y producto) en el de menor ID,
+    sumando sus cantidades, antes de crear la restricción única.
+    """
+    SupplierOrderItem = apps.get_model('gestion', 'SupplierOrderItem')
+    duplicates = (
+        SupplierOrderItem.objects.values('order_id', 'product_id')
+        .annotate(count=models.Count('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        items = list(
+            SupplierOrderItem.objects.filter(
+                order_id=duplicate['order_id'],
+                product_id=duplicate['product_id']
+            ).order_by('id')
+        )
+        keep, extra = items[0], items[1:]
+        keep.quantity = sum(item.quantity for item in items)
+        # El último item agregado tiene el precio más reciente
+        keep.unit_price = extra[-1].unit_price
+        keep.save(update_fields=['quantity', 'unit_price'])
+        SupplierOrderItem.objects.filter(pk__in=[item.pk for item in extra]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0018_product_sku_upper_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='supplierorderitem',
+            constraint=models.UniqueConstraint(fields=('order', 'product'), name='unique_supplier_order_item_product'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 # gestion/models/product.py
 from django.db import models
 from django.db.models import Sum, Q
+from django.db.models.functions import Upper
 from django.core.validators import MinValueValidator
 
 class Product(models.Model):
@@ -253,7 +254,8 @@ class Product(models.Model):
         verbose_name_plural = "Productos"
         ordering = ['name']
         indexes = [
-            models.Index(fields=['is_active', 'name']),  # Índice compuesto para listado
+            models.Index(fields=['is_active', 'name', 'id']),  # Índice compuesto para listado (y paginación por cursor)
             models.Index(fields=['is_active', 'categoria']),  # Índice para filtros por categoría
             models.Index(fields=['is_active', 'precio_venta']),  # Índice para ordenamiento por precio
+            models.Index(Upper('sku'), name='gestion_product_sku_upper_idx'),  # Búsqueda exacta de SKU sin distinguir mayúsculas
         ]
@@ -63,6 +63,10 @@ class SupplierOrderItem(models.Model):
     class Meta:
         verbose_name = "Item de Orden"
         verbose_name_plural = "Items de Orden"
+        constraints = [
+            # Un producto aparece una sola vez por orden (se suma la cantidad)
+            models.UniqueConstraint(fields=['order', 'product'], name='unique_supplier_order_item_product'),
+        ]
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
@@ -19,6 +19,7 @@ class Warehouse(models.Model):
         help_text="Indica si la bodega está activa"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
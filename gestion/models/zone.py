@@ -20,6 +20,7 @@ class Zone(models.Model):
         help_text="Indica si la zona está activa"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} (in {self.warehouse.name})"
@@ -0,0 +1,29 @@
+# gestion/responses.py
+# orjson serializa varias veces más rápido que json de la librería estándar
+import orjson
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+# Serializa Decimal y datetime (y otros tipos que orjson no maneja) igual que JsonResponse
+_django_json_default = DjangoJSONEncoder().default
+
+
+class OrjsonResponse(HttpResponse):
+    """
+    Equivalente a JsonResponse pero serializando con orjson.
+    Los tipos que orjson no soporta (Decimal, datetime, UUID, etc.) se
+    delegan a DjangoJSONEncoder para producir la misma salida que JsonResponse.
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps_json(data), **kwargs)
+
+
+def dumps_json(data):
+    """Serializa data a bytes JSON con orjson."""
+    return orjson.dumps(
+        data,
+        default=_django_json_default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME
+    )
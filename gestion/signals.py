@@ -0,0 +1,15 @@
+# gestion/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache_utils import invalidate_zones_cache
+from .models import Warehouse, Zone
+
+
+@receiver(post_save, sender=Zone)
+@receiver(post_delete, sender=Zone)
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+def clear_zones_cache(sender, **kwargs):
+    """Las zonas (y el nombre de su bodega) cambiaron: invalidar la caché."""
+    invalidate_zones_cache()
@@ -2,17 +2,28 @@
 
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Sum
+from django.core.cache import cache
+from django.db.models import Q, Sum, Max, Count, F, DecimalField, ExpressionWrapper
 from django.db.models.functions import Coalesce
 from django.db import transaction
-from django.views.decorators.http import require_http_methods
+from django.utils import timezone
+from django.views.decorators.http import condition, require_http_methods
 from decimal import Decimal
+import hashlib
+from itertools import groupby
+from operator import itemgetter
 import json
+import re
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from ..models import Inventory, Zone, Product, Sale, SaleItem, Client, SupplierOrder, SupplierOrderItem, ProductSupplier
+from ..auth_utils import is_bodega_or_admin
+from ..cache_utils import (
+    SALES_ZONE_CACHE_KEY, SALES_ZONE_CACHE_TIMEOUT, ZONES_CACHE_TIMEOUT, get_zones_cache_version
+)
+from ..responses import OrjsonResponse
+from ..models import Inventory, Warehouse, Zone, Product, Sale, SaleItem, Client, SupplierOrder, SupplierOrderItem, ProductSupplier
 
 @login_required
 def get_product_stock_info(request, product_id):
@@ -47,34 +58,28 @@ def get_product_warehouses_and_zones(request, product_id):
     Agrupado por bodega para facilitar la selección en devoluciones.
     """
     try:
-        # Buscar inventario del producto con stock > 0
-        stock_items = Inventory.objects.filter(
+        # Buscar inventario del producto con stock > 0, ordenado por bodega
+        # (mismo orden que Zone.Meta) para poder agrupar sin diccionarios
+        stock_rows = Inventory.objects.filter(
             product_id=product_id,
             quantity__gt=0
-        ).select_related('zone', 'zone__warehouse')
+        ).values(
+            'zone__warehouse_id', 'zone__warehouse__name', 'zone_id', 'zone__name', 'quantity'
+        ).order_by('zone__warehouse_id', 'zone__name')
         
         # Agrupar por bodega
-        warehouses_dict = {}
-        for item in stock_items:
-            warehouse_id = item.zone.warehouse.id
-            warehouse_name = item.zone.warehouse.name
-            
-            if warehouse_id not in warehouses_dict:
-                warehouses_dict[warehouse_id] = {
-                    'id': warehouse_id,
-                    'name': warehouse_name,
-                    'zones': []
-                }
-            
-            warehouses_dict[warehouse_id]['zones'].append({
-                'id': item.zone.id,
-                'name': item.zone.name,
-                'stock': item.quantity
+        warehouses_list = []
+        for warehouse_id, rows in groupby(stock_rows, key=itemgetter('zone__warehouse_id')):
+            rows = list(rows)
+            warehouses_list.append({
+                'id': warehouse_id,
+                'name': rows[0]['zone__warehouse__name'],
+                'zones': [
+                    {'id': row['zone_id'], 'name': row['zone__name'], 'stock': row['quantity']}
+                    for row in rows
+                ]
             })
         
-        # Convertir a lista
-        warehouses_list = list(warehouses_dict.values())
-        
         return JsonResponse({
             'status': 'success',
             'warehouses': warehouses_list
@@ -86,17 +91,83 @@ def get_product_warehouses_and_zones(request, product_id):
             'message': str(e)
         }, status=500)
 
+# --- HELPERS: Versión de los datos para GET condicional (ETag / Last-Modified) ---
+def _etag(*parts):
+    """Convierte las partes de la versión en un ETag compacto."""
+    return hashlib.md5('-'.join(map(str, parts)).encode(), usedforsecurity=False).hexdigest()
+
+def _last_modified(*values):
+    """Devuelve la fecha más reciente entre las dadas (ignorando None)."""
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+def _zones_version(request):
+    """
+    Resume el estado de las zonas (y bodegas, que aparecen en el nombre)
+    con dos agregados baratos, guardados en caché junto con el listado.
+    Se guarda en el request para que ETag y Last-Modified no repitan la búsqueda.
+    """
+    if not hasattr(request, '_zones_version'):
+        cache_version = get_zones_cache_version()
+        zones_version = cache.get('zones_version', version=cache_version)
+        if zones_version is None:
+            zones = Zone.objects.aggregate(last=Max('updated_at'), count=Count('id', filter=Q(is_active=True)))
+            warehouses = Warehouse.objects.aggregate(last=Max('updated_at'))
+            zones_version = {
+                'etag': _etag('zones', zones['count'], zones['last'], warehouses['last']),
+                'last_modified': _last_modified(zones['last'], warehouses['last']),
+            }
+            cache.set('zones_version', zones_version, ZONES_CACHE_TIMEOUT, version=cache_version)
+        request._zones_version = zones_version
+    return request._zones_version
+
+def _products_for_sale_version(request):
+    """
+    Resume el estado de productos e inventario (precio, nombre y stock)
+    para el listado de productos a la venta.
+    
+    Con paginación por cursor o parámetros inválidos no se calcula: los
+    agregados recorren las dos tablas completas (updated_at no tiene índice),
+    justo lo que el cursor evita, y un error 400 no debe responderse con 304.
+    Esas respuestas se envían sin ETag ni Last-Modified.
+    """
+    page_params = _products_for_sale_page_params(request.GET)
+    if page_params is None or page_params[2] is not None:
+        return {'etag': None, 'last_modified': None}
+    if not hasattr(request, '_products_for_sale_version'):
+        products = Product.objects.aggregate(last=Max('updated_at'), count=Count('id', filter=Q(is_active=True)))
+        stock = Inventory.objects.aggregate(last=Max('updated_at'), count=Count('id'))
+        request._products_for_sale_version = {
+            'etag': _etag(
+                'products', products['count'], products['last'],
+                stock['count'], stock['last'], request.GET.urlencode()
+            ),
+            'last_modified': _last_modified(products['last'], stock['last']),
+            'count': products['count'],
+        }
+    return request._products_for_sale_version
+
+
 @login_required
+@condition(
+    etag_func=lambda request: _zones_version(request)['etag'],
+    last_modified_func=lambda request: _zones_version(request)['last_modified']
+)
 def get_all_zones(request):
     """
     Devuelve TODAS las zonas (para el dropdown de destino).
     """
-    zones = Zone.objects.filter(is_active=True).select_related('warehouse')
-    all_zones_list = [
-        {'id': zone.id, 'name': str(zone)}
-        for zone in zones
-    ]
-    return JsonResponse({'status': 'success', 'zones': all_zones_list})
+    cache_version = get_zones_cache_version()
+    all_zones_list = cache.get('all_zones', version=cache_version)
+    if all_zones_list is None:
+        # Solo traemos las columnas necesarias; el nombre se arma igual que Zone.__str__
+        zones = Zone.objects.filter(is_active=True).values('id', 'name', 'warehouse__name')
+        all_zones_list = [
+            {'id': zone['id'], 'name': f"{zone['name']} (in {zone['warehouse__name']})"}
+            for zone in zones
+        ]
+        cache.set('all_zones', all_zones_list, ZONES_CACHE_TIMEOUT, version=cache_version)
+    return OrjsonResponse({'status': 'success', 'zones': all_zones_list})
 
 
 @api_view(['GET'])
@@ -106,115 +177,195 @@ def get_zones_by_warehouse(request, warehouse_id):
     Devuelve las zonas de una bodega específica.
     """
     try:
-        zones = Zone.objects.filter(warehouse_id=warehouse_id, is_active=True).select_related('warehouse')
-        zones_list = [
-            {'id': zone.id, 'name': zone.name}
-            for zone in zones
-        ]
+        cache_version = get_zones_cache_version()
+        cache_key = f'zones_by_warehouse_{warehouse_id}'
+        zones_list = cache.get(cache_key, version=cache_version)
+        if zones_list is None:
+            zones = Zone.objects.filter(warehouse_id=warehouse_id, is_active=True).values('id', 'name')
+            zones_list = [
+                {'id': zone['id'], 'name': zone['name']}
+                for zone in zones
+            ]
+            cache.set(cache_key, zones_list, ZONES_CACHE_TIMEOUT, version=cache_version)
         return Response({'status': 'success', 'zones': zones_list})
     except Exception as e:
         return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 # --- HELPER FUNCTION: Obtener zona de ventas ---
-def get_sales_zone():
+def get_sales_zone_id():
     """
-    Busca la zona de ventas. Intenta por nombre "Ventas" o similar.
-    Si no existe, toma la primera zona activa.
+    Devuelve el ID de la zona de ventas, guardado en caché para no
+    consultarlo en cada venta. Busca por nombre "Ventas" o similar;
+    si no existe, toma la primera zona activa.
     """
     try:
-        # Primero intentamos buscar una zona con nombre que contenga "venta"
-        sales_zone = Zone.objects.filter(
-            name__icontains='venta',
-            is_active=True
-        ).first()
-        
-        if not sales_zone:
-            # Si no existe, tomamos la primera zona activa
-            sales_zone = Zone.objects.filter(is_active=True).first()
+        sales_zone_id = cache.get(SALES_ZONE_CACHE_KEY)
+        if sales_zone_id is None:
+            # Primero intentamos buscar una zona con nombre que contenga "venta"
+            sales_zone_id = Zone.objects.filter(
+                name__icontains='venta',
+                is_active=True
+            ).values_list('id', flat=True).first()
+            
+            if sales_zone_id is None:
+                # Si no existe, tomamos la primera zona activa
+                sales_zone_id = Zone.objects.filter(is_active=True).values_list('id', flat=True).first()
+            
+            # Solo guardamos en caché si encontramos una zona
+            if sales_zone_id is not None:
+                cache.set(SALES_ZONE_CACHE_KEY, sales_zone_id, SALES_ZONE_CACHE_TIMEOUT)
         
-        return sales_zone
+        return sales_zone_id
     except:
         return None
 
+def get_sales_zone():
+    """
+    Busca la zona de ventas. Intenta por nombre "Ventas" o similar.
+    Si no existe, toma la primera zona activa.
+    """
+    sales_zone_id = get_sales_zone_id()
+    if sales_zone_id is None:
+        return None
+    # El ID en caché puede ser de una zona ya desactivada (la caché es por proceso)
+    return Zone.objects.filter(pk=sales_zone_id, is_active=True).first()
+
 # --- API: Buscar productos para venta ---
+# Un SKU es un único token (ej: PROD-0001, REP-000123)
+_SKU_TOKEN_RE = re.compile(r'[\w-]+')
+SKU_MAX_LENGTH = Product._meta.get_field('sku').max_length
+
+# Columnas que necesitan los listados de productos a la venta (requiere la anotación total_stock)
+_PRODUCT_FOR_SALE_FIELDS = ('id', 'name', 'sku', 'precio_venta', 'total_stock')
+
+def _product_for_sale_data(row):
+    """
+    Arma el dict de un producto a la venta desde una fila de values_list
+    (sin instanciar el modelo). Compartido por la búsqueda y el listado.
+    """
+    product_id, name, sku, precio_venta, total_stock = row
+    return {
+        'id': product_id,
+        'name': name,
+        'sku': sku,
+        # Convertir precio a número (float) para que funcione correctamente en el frontend
+        'price': float(precio_venta) if precio_venta else 0.0,
+        # Stock total sumando todas las zonas (igual que en movimientos)
+        'stock': int(total_stock)
+    }
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def search_products_for_sale(request):
     """
-    Busca productos por nombre o SKU y devuelve su precio y 
+    Busca productos por nombre (parcial) o SKU (exacto) y devuelve su precio y 
     el stock TOTAL disponible (suma de todas las zonas).
     """
     query = request.query_params.get('q', '') or request.query_params.get('query', '')
-    if len(query) < 2: # No buscar con menos de 2 caracteres
+    if len(query) < 3: # No buscar con menos de 3 caracteres (mínimo para el índice trigram)
         return Response({'status': 'success', 'products': []})
 
     try:
-        # 1. Buscamos productos que coincidan con prefetch de inventario para optimizar
+        # 1. Buscamos productos que coincidan y calculamos el stock total en la BD
+        # (suma de todas las zonas, igual que en movimientos) con un solo GROUP BY
+        # El SKU se busca exacto (índice UPPER(sku)) solo si la búsqueda parece un SKU
+        search_filter = Q(name__icontains=query)
+        if len(query) <= SKU_MAX_LENGTH and _SKU_TOKEN_RE.fullmatch(query):
+            search_filter |= Q(sku__iexact=query)
+        
         products = Product.objects.filter(
-            Q(name__icontains=query) | Q(sku__icontains=query),
+            search_filter,
             is_active=True
-        ).prefetch_related('stock')[:10] # Limitamos a 10 resultados
+        ).annotate(
+            total_stock=Coalesce(Sum('stock__quantity'), 0)
+        ).order_by('name', 'id').values_list(*_PRODUCT_FOR_SALE_FIELDS)[:10] # Limitamos a 10 resultados
+        # (order_by explícito: con GROUP BY Django no aplica Meta.ordering)
 
-        results = []
-        for product in products:
-            # 2. Calcular stock total sumando todas las zonas (igual que en movimientos)
-            # Usar el prefetch para evitar consultas adicionales
-            total_stock = sum(item.quantity for item in product.stock.all())
-            available_stock = int(total_stock)
-
-            # Convertir precio a número (float) para que funcione correctamente en el frontend
-            precio_venta = float(product.precio_venta or 0)
-            
-            results.append({
-                'id': product.id,
-                'name': product.name,
-                'sku': product.sku,
-                'price': precio_venta,  # Número, no string
-                'stock': available_stock
-            })
+        # 2. El stock total ya viene calculado desde la consulta
+        results = [_product_for_sale_data(row) for row in products]
         
-        return Response({'status': 'success', 'products': results})
+        return OrjsonResponse({'status': 'success', 'products': results})
 
     except Exception as e:
         return Response({'status': 'error', 'message': str(e)}, status=500)
 
 # --- API: Obtener todos los productos disponibles para venta ---
+PRODUCTS_FOR_SALE_PAGE_SIZE = 50
+PRODUCTS_FOR_SALE_MAX_PAGE_SIZE = 100  # Igual que max_page_size de OptimizedPageNumberPagination
+
+def _products_for_sale_page_params(params):
+    """
+    Lee page, page_size y after_id (cursor) de los parámetros GET.
+    Devuelve None si no son enteros válidos; page_size se limita al máximo.
+    """
+    try:
+        page = int(params.get('page', 1))
+        page_size = int(params.get('page_size', PRODUCTS_FOR_SALE_PAGE_SIZE))
+        after_id = params.get('after_id')
+        if after_id is not None:
+            after_id = int(after_id)
+    except ValueError:
+        return None
+    if page < 1 or page_size < 1:
+        return None
+    return page, min(page_size, PRODUCTS_FOR_SALE_MAX_PAGE_SIZE), after_id
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@condition(
+    etag_func=lambda request: _products_for_sale_version(request)['etag'],
+    last_modified_func=lambda request: _products_for_sale_version(request)['last_modified']
+)
 def get_all_products_for_sale(request):
     """
     Devuelve todos los productos activos con su precio y stock TOTAL disponible
     (suma de todas las zonas, igual que en el módulo de movimientos).
+    
+    Paginación por número de página (?page=) o, para páginas profundas, por
+    cursor (?after_name=&after_id= con los valores next_after_* de la respuesta
+    anterior), que no recorre las filas previas ni hace COUNT(*).
     """
+    # Validar los parámetros de paginación antes de consultar
+    page_params = _products_for_sale_page_params(request.query_params)
+    if page_params is None:
+        return Response({'status': 'error', 'message': 'Parámetros de paginación inválidos'}, status=400)
+    page, page_size, after_id = page_params
+    after_name = request.query_params.get('after_name', '')
+    
     try:
-        # Obtener parámetros de paginación
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 50))
-        offset = (page - 1) * page_size
-        
-        # Obtener todos los productos activos con prefetch de inventario para optimizar
-        products = Product.objects.filter(is_active=True).prefetch_related('stock').order_by('name')[offset:offset + page_size]
-        total = Product.objects.filter(is_active=True).count()
+        # Obtener todos los productos activos con el stock total calculado en la BD
+        products = Product.objects.filter(is_active=True)
+        if after_id is not None:
+            # Paginación por cursor: continuar después del último (name, id) recibido
+            products = products.filter(
+                Q(name__gt=after_name) | Q(name=after_name, id__gt=after_id)
+            )
+        products = products.annotate(
+            total_stock=Coalesce(Sum('stock__quantity'), 0)
+        ).order_by('name', 'id').values_list(*_PRODUCT_FOR_SALE_FIELDS)
         
-        results = []
-        for product in products:
-            # Calcular stock total sumando todas las zonas (igual que en movimientos)
-            # Usar el prefetch para evitar consultas adicionales
-            total_stock = sum(item.quantity for item in product.stock.all())
-            available_stock = int(total_stock)
-            
-            precio_venta = float(product.precio_venta or 0)
+        if after_id is not None:
+            # Pedimos una fila extra solo para saber si hay página siguiente
+            rows = list(products[:page_size + 1])
+            has_next = len(rows) > page_size
+            results = [_product_for_sale_data(row) for row in rows[:page_size]]
             
-            results.append({
-                'id': product.id,
-                'name': product.name,
-                'sku': product.sku,
-                'price': precio_venta,
-                'stock': available_stock
+            return OrjsonResponse({
+                'status': 'success',
+                'products': results,
+                'page_size': page_size,
+                'has_next': has_next,
+                'next_after_name': results[-1]['name'] if has_next else None,
+                'next_after_id': results[-1]['id'] if has_next else None
             })
         
-        return Response({
+        offset = (page - 1) * page_size
+        results = [_product_for_sale_data(row) for row in products[offset:offset + page_size]]
+        # El total de productos activos ya se contó para el ETag: no repetir el COUNT(*)
+        total = _products_for_sale_version(request)['count']
+        
+        return OrjsonResponse({
             'status': 'success',
             'products': results,
             'count': total,
@@ -241,71 +392,109 @@ def process_sale(request):
         if not cart:
             return JsonResponse({'status': 'error', 'errors': 'El carrito está vacío'}, status=400)
         
-        sales_zone = get_sales_zone()
-        if not sales_zone:
+        sales_zone_id = get_sales_zone_id()
+        if not sales_zone_id:
             return JsonResponse({'status': 'error', 'errors': 'Zona de ventas no configurada'}, status=500)
         
-        # Validar stock antes de procesar
-        errors = []
+        # IDs del carrito como enteros (None si el ID falta o no es válido)
+        cart_ids = []
         for item in cart:
-            product_id = item.get('id')
-            quantity = item.get('quantity', 0)
-            
             try:
-                product = Product.objects.get(id=product_id, is_active=True)
-                try:
-                    inventory = Inventory.objects.get(product=product, zone=sales_zone)
-                    if inventory.quantity < quantity:
-                        errors.append(
-                            f"Stock insuficiente para {product.name}. "
-                            f"Disponible: {inventory.quantity}, Solicitado: {quantity}"
-                        )
-                except Inventory.DoesNotExist:
-                    errors.append(f"No hay stock de {product.name} en la zona de ventas")
-            except Product.DoesNotExist:
-                errors.append(f"Producto con ID {product_id} no encontrado")
-        
-        if errors:
-            return JsonResponse({'status': 'error', 'errors': '<br>'.join(errors)}, status=400)
+                cart_ids.append(int(item.get('id')))
+            except (TypeError, ValueError):
+                cart_ids.append(None)
+        valid_ids = [product_id for product_id in cart_ids if product_id is not None]
         
-        # Si todo está bien, procesamos la venta
         with transaction.atomic():
-            # 1. Crear la venta
+            # Traer en una sola consulta el inventario (con su producto) de todo el carrito,
+            # bloqueando esas filas hasta terminar para que otra venta no descuente el mismo stock
+            inv_map = {
+                inv.product_id: inv
+                for inv in Inventory.objects.select_for_update(of=('self',)).select_related('product').filter(
+                    product_id__in=valid_ids,
+                    zone_id=sales_zone_id,
+                    # La caché de la zona es por proceso: no vender desde una zona ya desactivada
+                    zone__is_active=True,
+                    product__is_active=True
+                ).order_by('product_id')  # Orden fijo de bloqueo para evitar deadlocks
+            }
+            
+            # Solo si faltan productos consultamos sus nombres para el mensaje de error
+            missing_ids = [product_id for product_id in valid_ids if product_id not in inv_map]
+            missing_names = dict(
+                Product.objects.filter(id__in=missing_ids, is_active=True).values_list('id', 'name')
+            ) if missing_ids else {}
+            
+            # Cantidad total pedida por producto (un producto puede venir en varias líneas)
+            requested = {}
+            for product_id, item in zip(cart_ids, cart):
+                if product_id in inv_map:
+                    requested[product_id] = requested.get(product_id, 0) + item.get('quantity', 0)
+            
+            # Validar stock antes de procesar
+            errors = []
+            checked_ids = set()
+            for product_id, item in zip(cart_ids, cart):
+                inventory = inv_map.get(product_id)
+                if inventory is None:
+                    if product_id in missing_names:
+                        errors.append(f"No hay stock de {missing_names[product_id]} en la zona de ventas")
+                    else:
+                        errors.append(f"Producto con ID {item.get('id')} no encontrado")
+                elif product_id not in checked_ids:
+                    # El stock se compara una vez por producto contra el total pedido
+                    checked_ids.add(product_id)
+                    if inventory.quantity < requested[product_id]:
+                        errors.append(
+                            f"Stock insuficiente para {inventory.product.name}. "
+                            f"Disponible: {inventory.quantity}, Solicitado: {requested[product_id]}"
+                        )
+            
+            if errors:
+                return JsonResponse({'status': 'error', 'errors': '<br>'.join(errors)}, status=400)
+            
+            # Calcular el total desde el carrito para insertar la venta una sola vez
+            total_amount = sum(
+                (
+                    (inv_map[product_id].product.precio_venta or Decimal('0.00')) * Decimal(item.get('quantity', 0))
+                    for product_id, item in zip(cart_ids, cart)
+                ),
+                Decimal('0.00')
+            )
+            
+            # Si todo está bien, procesamos la venta
+            # 1. Crear la venta con su total
             sale = Sale.objects.create(
                 client_id=client_id if client_id else None,
                 user=request.user,
-                total_amount=Decimal('0.00')  # Se calculará al final
+                total_amount=total_amount
             )
             
-            total_amount = Decimal('0.00')
+            sale_items = []
+            now = timezone.now()  # bulk_update no aplica auto_now en updated_at
             
-            # 2. Crear los items y descontar stock
-            for item in cart:
-                product_id = item.get('id')
+            # 2. Preparar los items y descontar stock (reutilizando el inventario ya cargado)
+            for product_id, item in zip(cart_ids, cart):
                 quantity = item.get('quantity', 0)
                 
-                product = Product.objects.get(id=product_id)
-                inventory = Inventory.objects.get(product=product, zone=sales_zone)
+                inventory = inv_map[product_id]
+                product = inventory.product
                 
-                # Crear el item de venta
-                sale_price = product.precio_venta or Decimal('0.00')
-                item_price = sale_price * Decimal(quantity)
-                SaleItem.objects.create(
+                # Preparar el item de venta
+                sale_items.append(SaleItem(
                     sale=sale,
                     product=product,
                     quantity=quantity,
-                    price_at_sale=sale_price
-                )
+                    price_at_sale=product.precio_venta or Decimal('0.00')
+                ))
                 
                 # Descontar stock
                 inventory.quantity -= quantity
-                inventory.save()
-                
-                total_amount += item_price
+                inventory.updated_at = now
             
-            # 3. Actualizar el total de la venta
-            sale.total_amount = total_amount
-            sale.save()
+            # 3. Guardar items e inventario en lote
+            SaleItem.objects.bulk_create(sale_items)
+            Inventory.objects.bulk_update(inv_map.values(), ['quantity', 'updated_at'])
         
         return JsonResponse({
             'status': 'success',
@@ -336,18 +525,49 @@ def get_product_price(request, product_id):
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
 
+# --- HELPER FUNCTION: Items de una orden a proveedor ---
+_CENT = Decimal('0.01')
+
+def _get_order_items_data(order_id):
+    """
+    Devuelve los items de una orden (listos para JSON) y la cantidad total.
+    El subtotal se calcula en la BD y solo se traen las columnas necesarias.
+    """
+    items = SupplierOrderItem.objects.filter(order_id=order_id).annotate(
+        item_subtotal=ExpressionWrapper(
+            F('quantity') * F('unit_price'),
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        )
+    ).values('id', 'product__name', 'quantity', 'unit_price', 'item_subtotal')
+    
+    items_data = [
+        {
+            'id': item['id'],
+            'product_name': item['product__name'],
+            'quantity': item['quantity'],
+            'unit_price': str(item['unit_price']),
+            # quantize: SQLite no respeta decimal_places en expresiones
+            'subtotal': str(item['item_subtotal'].quantize(_CENT))
+        }
+        for item in items
+    ]
+    total_quantity = sum(item['quantity'] for item in items_data)
+    
+    return items_data, total_quantity
+
+
 @login_required
 @require_http_methods(["POST"])
 def add_product_to_order(request, order_pk):
     """
     API para agregar un producto a una orden usando AJAX.
     """
-    if not (request.user.is_superuser or hasattr(request.user, 'profile') and 
-            (request.user.profile.role == 'admin' or request.user.profile.role == 'bodega')):
+    if not is_bodega_or_admin(request.user):
         return JsonResponse({'status': 'error', 'message': 'No tienes permisos'}, status=403)
     
     try:
-        order = SupplierOrder.objects.get(pk=order_pk)
+        # Solo necesitamos el estado y el proveedor de la orden
+        order = SupplierOrder.objects.only('id', 'status', 'supplier_id').get(pk=order_pk)
         
         if order.status != 'PENDING':
             return JsonResponse({'status': 'error', 'message': 'No se pueden modificar órdenes que no están pendientes'}, status=400)
@@ -359,65 +579,46 @@ def add_product_to_order(request, order_pk):
         if quantity <= 0:
             return JsonResponse({'status': 'error', 'message': 'La cantidad debe ser mayor a 0'}, status=400)
         
-        product = Product.objects.get(pk=product_id, is_active=True)
+        product = Product.objects.only('id', 'name', 'precio_venta').get(pk=product_id, is_active=True)
         
         # Verificar que el producto pertenece al proveedor de la orden (a través de ProductSupplier)
         product_supplier = ProductSupplier.objects.filter(
-            product=product,
-            supplier=order.supplier
-        ).first()
+            product_id=product.id,
+            supplier_id=order.supplier_id
+        ).values('costo').first()
         
         if not product_supplier:
             return JsonResponse({'status': 'error', 'message': 'Este producto no pertenece al proveedor de la orden'}, status=400)
         
         # Obtener el precio del proveedor (costo) o usar precio_venta como fallback
-        unit_price = product_supplier.costo if product_supplier.costo else product.precio_venta
+        unit_price = product_supplier['costo'] if product_supplier['costo'] else product.precio_venta
         
-        # Verificar si el producto ya está en la orden
-        existing_item = SupplierOrderItem.objects.filter(order=order, product=product).first()
+        # Crear el item o, si el producto ya está en la orden, sumar la cantidad
+        item, created = SupplierOrderItem.objects.get_or_create(
+            order=order,
+            product=product,
+            defaults={'quantity': quantity, 'unit_price': unit_price}
+        )
         
-        if existing_item:
-            # Si ya existe, actualizar la cantidad
-            existing_item.quantity += quantity
-            existing_item.unit_price = unit_price  # Actualizar precio por si cambió
-            existing_item.save()
-            item = existing_item
-            action = 'updated'
+        if created:
+            action = 'created'
         else:
-            # Si no existe, crear nuevo item
-            item = SupplierOrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                unit_price=unit_price
+            # Incremento atómico en la BD para no perder cantidades con peticiones concurrentes
+            SupplierOrderItem.objects.filter(pk=item.pk).update(
+                quantity=F('quantity') + quantity,
+                unit_price=unit_price  # Actualizar precio por si cambió
             )
-            action = 'created'
+            action = 'updated'
         
-        # Obtener todos los items actualizados
-        items = SupplierOrderItem.objects.filter(order=order).select_related('product')
-        items_data = []
-        total_quantity = 0
-        for order_item in items:
-            items_data.append({
-                'id': order_item.id,
-                'product_name': order_item.product.name,
-                'quantity': order_item.quantity,
-                'unit_price': str(order_item.unit_price),
-                'subtotal': str(order_item.subtotal)
-            })
-            total_quantity += order_item.quantity
+        # Obtener todos los items actualizados (incluye los valores ya persistidos del item)
+        items_data, total_quantity = _get_order_items_data(order.pk)
+        item_data = next(data for data in items_data if data['id'] == item.pk)
         
         return JsonResponse({
             'status': 'success',
             'message': f'Producto {product.name} agregado exitosamente',
             'action': action,
-            'item': {
-                'id': item.id,
-                'product_name': item.product.name,
-                'quantity': item.quantity,
-                'unit_price': str(item.unit_price),
-                'subtotal': str(item.subtotal)
-            },
+            'item': item_data,
             'all_items': items_data,
             'total_items': len(items_data),
             'total_quantity': total_quantity
@@ -439,28 +640,17 @@ def get_order_items(request, order_pk):
     API para obtener los items de una orden en formato JSON.
     """
     try:
-        order = SupplierOrder.objects.get(pk=order_pk)
-        items = SupplierOrderItem.objects.filter(order=order).select_related('product')
+        items_data, total_quantity = _get_order_items_data(order_pk)
         
-        items_data = []
-        total_quantity = 0
-        for item in items:
-            items_data.append({
-                'id': item.id,
-                'product_name': item.product.name,
-                'quantity': item.quantity,
-                'unit_price': str(item.unit_price),
-                'subtotal': str(item.subtotal)
-            })
-            total_quantity += item.quantity
+        # Sin items puede ser una orden vacía o inexistente: solo entonces lo verificamos
+        if not items_data and not SupplierOrder.objects.filter(pk=order_pk).exists():
+            return JsonResponse({'status': 'error', 'message': 'Orden no encontrada'}, status=404)
         
-        return JsonResponse({
+        return OrjsonResponse({
             'status': 'success',
             'items': items_data,
             'total_items': len(items_data),
             'total_quantity': total_quantity
         })
-    except SupplierOrder.DoesNotExist:
-        return JsonResponse({'status': 'error', 'message': 'Orden no encontrada'}, status=404)
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
@@ -3,7 +3,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Q, Sum, Prefetch
+from django.db.models import Q, Sum, Prefetch, F
 from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.contrib.auth import logout as django_logout
@@ -916,21 +916,21 @@ class SupplierOrderViewSet(viewsets.ModelViewSet):
         
         unit_price = product_supplier.costo if product_supplier.costo else product.precio_venta
         
-        # Verificar si el producto ya está en la orden
-        existing_item = SupplierOrderItem.objects.filter(order=order, product=product).first()
+        # Si el producto ya está en la orden se suma la cantidad. La restricción
+        # única (orden, producto) hace que get_or_create no duplique el item
+        item, created = SupplierOrderItem.objects.get_or_create(
+            order=order,
+            product=product,
+            defaults={'quantity': quantity, 'unit_price': unit_price}
+        )
         
-        if existing_item:
-            existing_item.quantity += quantity
-            existing_item.unit_price = unit_price
-            existing_item.save()
-            item = existing_item
-        else:
-            item = SupplierOrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
+        if not created:
+            # Incremento atómico en la BD para no perder cantidades con peticiones concurrentes
+            SupplierOrderItem.objects.filter(pk=item.pk).update(
+                quantity=F('quantity') + quantity,
                 unit_price=unit_price
             )
+            item.refresh_from_db(fields=['quantity', 'unit_price'])
         
         serializer = SupplierOrderItemSerializer(item)
         return Response(serializer.data, status=status.HTTP_201_CREATED)